@@ -1,20 +1,30 @@
 import argparse
 import json
-import math
+import sys
 from ipaddress import IPv4Network
 from pathlib import Path
-from typing import Literal
+from socket import inet_ntoa
+from typing import Any, Literal, TextIO
 
-try:
-    import yaml
-    from pydantic import BaseModel, Field
-except ImportError:
+
+def exit_missing_packages():
     print('Install the following packages')
     print('pydantic>=2.7.2,<3')
     print('PyYaml>=6.0.0,<7.0.0')
     exit(1)
 
 
+try:
+    from pydantic import BaseModel, Field, PrivateAttr, model_validator
+except ImportError:
+    exit_missing_packages()
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
 class SubnetCountError(Exception):
     pass
 
@@ -27,6 +37,47 @@ class SubnetMetadata(BaseModel, extra='forbid'):
 
 StructureType = list[list | str | dict[Literal["__placeholder__"], int]]
 
+# Frozen structure item kinds. Subnet-holding kinds come first so `tag <= NEST` selects them.
+LEAF, NEST, SKIP, MULTI_SKIP = range(4)
+
+FrozenStructureType = tuple[tuple[int, Any], ...]
+
+
+def freeze_structure(structure: StructureType) -> FrozenStructureType:
+    # Iterative so deeply nested structures do not hit the recursion limit.
+    # Each level is [source list, frozen items]; NEST payloads hold the child level index until resolved.
+    levels = [[structure, None]]
+    index = 0
+    while index < len(levels):
+        frozen = []
+        for item in levels[index][0]:
+            if item is None or item == '__placeholder__':
+                frozen.append((SKIP, None))
+            elif isinstance(item, list):
+                frozen.append((NEST, len(levels)))
+                levels.append([item, None])
+            elif isinstance(item, dict):
+                count = item['__placeholder__']
+                if count < 0:
+                    raise ValueError(f'Placeholder count cannot be negative (got {count}).')
+                frozen.append((MULTI_SKIP, count))
+            else:
+                frozen.append((LEAF, item))
+        levels[index][1] = frozen
+        index += 1
+
+    # Children are always discovered after their parent, so resolving backwards freezes them first.
+    for level in reversed(levels):
+        level[1] = tuple(
+            (NEST, levels[payload][1]) if tag == NEST else (tag, payload)
+            for tag, payload in level[1]
+        )
+    return levels[0][1]
+
+
+# Prefix needed to fit `value` subnets, precomputed for the usual fanouts.
+_SMALL_PREFIX = tuple(0 if value <= 1 else (value - 1).bit_length() for value in range(257))
+
 
 class NetworkStructureConfiguration(BaseModel, extra='forbid'):
     network_cidr: IPv4Network = Field(
@@ -40,6 +91,37 @@ class NetworkStructureConfiguration(BaseModel, extra='forbid'):
     structure: StructureType = Field(
         description='Subnet structure'
     )
+    _frozen_structure: FrozenStructureType | None = PrivateAttr(default=None)
+    _frozen_source: StructureType | None = PrivateAttr(default=None)
+
+    @model_validator(mode='after')
+    def _freeze_structure(self) -> 'NetworkStructureConfiguration':
+        self._refresh_frozen_structure()
+        return self
+
+    def _refresh_frozen_structure(self) -> None:
+        self._frozen_source = self.structure
+        self._frozen_structure = freeze_structure(self.structure)
+
+    @property
+    def frozen_structure(self) -> FrozenStructureType:
+        # Refreeze when built through model_construct or when `structure` was replaced since the last freeze.
+        if self._frozen_structure is None or self._frozen_source is not self.structure:
+            self._refresh_frozen_structure()
+        return self._frozen_structure
+
+    @classmethod
+    def from_trusted(cls, data: dict) -> 'NetworkStructureConfiguration':
+        configuration = cls.model_construct(
+            network_cidr=IPv4Network(data['network_cidr']),
+            metadata={
+                subnet_id: SubnetMetadata.model_construct(**(subnet_metadata or {}))
+                for subnet_id, subnet_metadata in (data.get('metadata') or {}).items()
+            },
+            structure=data['structure']
+        )
+        configuration._refresh_frozen_structure()
+        return configuration
 
 
 class Calculator:
@@ -56,52 +138,48 @@ class Calculator:
             self.default_metadata = default_metadata
 
     def compute(self) -> dict[str, IPv4Network]:
-        self._compute(self.config.network_cidr, self.config.structure)
+        self._compute(self.config.network_cidr, self.config.frozen_structure)
         return self.result
 
-    def _compute(self, parent_subnet: IPv4Network, structure: StructureType) -> None:
-        structure_len = self.find_structure_len(structure)
-        prefix = self.find_prefix(structure_len)
-        if prefix + parent_subnet.prefixlen > 32:
-            raise ValueError(f'Too many subnets! (Prefix is {prefix + parent_subnet.prefixlen})')
-
-        child_subnets = list(parent_subnet.subnets(prefix))
-        for i, structure_item in enumerate(structure):
-            child_subnet = child_subnets[i]
-            if structure_item in [None, '__placeholder__']:
-                continue
-            elif isinstance(structure_item, list):
-                self._compute(child_subnet, structure_item)
-            elif isinstance(structure_item, dict):
+    def _compute(self, parent_subnet: IPv4Network, structure: FrozenStructureType) -> None:
+        result = self.result
+        _Net = IPv4Network
+        find_prefix = self.find_prefix
+
+        # Pending (network address, prefix length, tag, payload) entries, popped in structure order.
+        stack = [(int(parent_subnet.network_address), parent_subnet.prefixlen, NEST, structure)]
+        while stack:
+            address, prefixlen, tag, payload = stack.pop()
+            if tag == LEAF:
+                result[payload] = _Net((address, prefixlen))
                 continue
-            else:
-                self.result[structure_item] = child_subnet
 
-    @classmethod
-    def find_structure_len(cls, structure: StructureType):
-        count = 0
-        for item in structure:
-            if isinstance(item, dict):
-                count += item['__placeholder__']
-            else:
-                count += 1
-        return count
+            # Single pass: collect the slot of every child while counting the slots.
+            structure_len = 0
+            children = []
+            for child_tag, child_payload in payload:
+                if child_tag <= NEST:
+                    children.append((structure_len, child_tag, child_payload))
+                structure_len += child_payload if child_tag == MULTI_SKIP else 1
+
+            new_prefix = prefixlen + find_prefix(structure_len)
+            if new_prefix > 32:
+                raise ValueError(f'Too many subnets! (Prefix is {new_prefix})')
+
+            step = 1 << (32 - new_prefix)
+            for slot, child_tag, child_payload in reversed(children):
+                stack.append((address + slot * step, new_prefix, child_tag, child_payload))
 
     @staticmethod
     def find_prefix(value: int) -> int:
-        for i in range(0, 32):
-            if value <= math.pow(2, i):
-                return i
-        raise ValueError(f'Cannot find prefix for {value}.')
+        if 0 <= value < 257:
+            return _SMALL_PREFIX[value]
+        if value > (1 << 32):
+            raise ValueError(f'Cannot find prefix for {value}.')
+        return 0 if value <= 1 else (value - 1).bit_length()
 
 
-class SubnetInfo(BaseModel, extra='forbid'):
-    id: str
-    name: str
-    description: str
-    cidr: IPv4Network
-    first_address: str
-    last_address: str
+TXT_ROW_FORMAT = '{:<20}{:<25}{:<15}{:<20}{:<20}{:<50}'.format
 
 
 class Exporter:
@@ -115,55 +193,73 @@ class Exporter:
         self.structure = structure
         self.default_metadata = default_metadata if default_metadata else SubnetMetadata(name='', description='---',
                                                                                          tier='---')
-        self.data: list[SubnetInfo] = []
+        self.data: list[tuple[str, str, str, str, int, str, str]] = []
         self.build_data()
 
     def build_data(self):
         if len(self.data) > 0:
             return
 
+        metadata_get = self.config.metadata.get
+        default_metadata = self.default_metadata
         for subnet_id, subnet_cidr in self.structure.items():
-            subnet_metadata = self.config.metadata.get(subnet_id, self.default_metadata)
-            subnet_result = SubnetInfo(
-                id=subnet_id,
-                name=subnet_metadata.name if len(subnet_metadata.name) > 0 else subnet_id,
-                cidr=subnet_cidr,
-                description=subnet_metadata.description,
-                first_address=subnet_cidr[0].compressed,
-                last_address=subnet_cidr[-1].compressed
-            )
-            self.data.append(subnet_result)
-
-    def export_txt(self) -> str:
-        result = [
-            f'{"NAME":<20}{"CIDR":<25}{"ADDRCOUNT":<15}{"FIRSTADDR":<20}'
-            f'{"LASTADDR":<20}{"DESCRIPTION":<50}'
-        ]
-        for info in self.data:
-            result.append(
-                f'{info.name:<20}'
-                f'{info.cidr.compressed:<25}'
-                f'{info.cidr.num_addresses:<15}'
-                f'{info.first_address:<20}'
-                f'{info.last_address:<20}'
-                f'{info.description:<50}'
-            )
-        return '\n'.join(result)
+            subnet_metadata = metadata_get(subnet_id, default_metadata)
+            name = subnet_metadata.name or subnet_id
+            network_int = int(subnet_cidr.network_address)
+            size = 1 << (32 - subnet_cidr.prefixlen)
+            first_address = inet_ntoa(network_int.to_bytes(4, 'big'))
+            last_address = inet_ntoa((network_int + size - 1).to_bytes(4, 'big'))
+            self.data.append((subnet_id, name, subnet_metadata.description, f'{first_address}/{subnet_cidr.prefixlen}',
+                              size, first_address, last_address))
+
+    def export_txt(self, fp: TextIO) -> None:
+        fp.write(TXT_ROW_FORMAT('NAME', 'CIDR', 'ADDRCOUNT', 'FIRSTADDR', 'LASTADDR', 'DESCRIPTION'))
+        for _, name, description, cidr, num_addresses, first_address, last_address in self.data:
+            fp.write('\n')
+            fp.write(TXT_ROW_FORMAT(name, cidr, num_addresses, first_address, last_address, description))
 
     def to_dict(self) -> dict:
+        subnets = []
+        for subnet_id, name, description, cidr, _, first_address, last_address in self.data:
+            subnets.append(dict(
+                id=subnet_id,
+                name=name,
+                cidr=cidr,
+                description=description,
+                first_address=first_address,
+                last_address=last_address
+            ))
         return {
             'network_cidr': self.config.network_cidr.compressed,
-            'subnets': [dict(
-                id=info.id,
-                name=info.name,
-                cidr=info.cidr.compressed,
-                description=info.description,
-                first_address=info.first_address,
-                last_address=info.last_address
-            ) for info in self.data]
+            'subnets': subnets
         }
 
 
+def dump_json(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+def import_yaml():
+    # PyYAML is only loaded by the commands reading or writing YAML.
+    try:
+        import yaml
+    except ImportError:
+        exit_missing_packages()
+    return yaml
+
+
+def load_yaml(text: str):
+    yaml = import_yaml()
+    return yaml.load(text, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+
+def dump_yaml(data) -> str:
+    yaml = import_yaml()
+    return yaml.dump(data, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper))
+
+
 def parse_cli_arguments():
     parser = argparse.ArgumentParser(prog='subnetcalculator')
     parser.add_argument(
@@ -179,6 +275,10 @@ def parse_cli_arguments():
         '--generate-example', default=None, choices=['simple', 'advanced', 'company'],
         help='Generate an example configuration file.'
     )
+    parser.add_argument(
+        '--skip-validation', default=False, action='store_true',
+        help='Load the configuration file without validating it. Only use it with trusted configurations.'
+    )
     parser.add_argument(
         '--out-stdout', default=False, action='store_true',
         help='Render the computation to the stdout using print.'
@@ -203,8 +303,8 @@ def cli():
     args = parse_cli_arguments()
 
     if args.generate_json_schema:
-        schema = NetworkStructureConfiguration.schema_json(indent=4)
-        Path(args.target).write_text(schema, encoding='utf-8')
+        schema = NetworkStructureConfiguration.model_json_schema()
+        Path(args.target).write_bytes(dump_json(schema))
         return
 
     if args.generate_example is not None:
@@ -212,28 +312,31 @@ def cli():
         Path(args.target).write_text(example, encoding='utf-8')
         return
 
-    configuration_raw = yaml.safe_load(Path(args.target).read_text(encoding='utf-8'))
-    configuration = NetworkStructureConfiguration(**configuration_raw)
+    configuration_raw = load_yaml(Path(args.target).read_text(encoding='utf-8'))
+    if args.skip_validation:
+        configuration = NetworkStructureConfiguration.from_trusted(configuration_raw)
+    else:
+        configuration = NetworkStructureConfiguration(**configuration_raw)
 
     calculator = Calculator(configuration)
     network_structure = calculator.compute()
 
     exporter = Exporter(configuration, network_structure)
     if args.out_stdout:
-        txt = exporter.export_txt()
-        print(txt)
+        exporter.export_txt(sys.stdout)
+        print()
 
     if args.out_txt:
-        txt = exporter.export_txt()
-        args.out_txt.write_text(txt, encoding='utf-8')
+        with args.out_txt.open('w', encoding='utf-8') as fp:
+            exporter.export_txt(fp)
 
     if args.out_json:
         data = exporter.to_dict()
-        args.out_json.write_text(json.dumps(data, indent=4), encoding='utf-8')
+        args.out_json.write_bytes(dump_json(data))
 
     if args.out_yaml:
         data = exporter.to_dict()
-        args.out_yaml.write_text(yaml.safe_dump(data), encoding='utf-8')
+        args.out_yaml.write_text(dump_yaml(data), encoding='utf-8')
 
 
 EXAMPLE_SIMPLE = """network_cidr: 10.1.0.0/16